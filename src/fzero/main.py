@@ -26,14 +26,25 @@ def cli(argv: t.Optional[t.List[str]] = None) -> None:
         metavar="INPUT_FILE",
         help="SRAM save file to import from. [Default: stdin]"
     )
+    parser.add_argument(
+        "--verify",
+        default=False,
+        action="store_true",
+        help="Self-check: verify exporting and re-importing the save yields the same data."
+    )
     args = parser.parse_args(argv)
     u.setup_logging(level=args.loglevel, fmt="%(levelname)-8s: %(message)s")
     log.debug(args)
 
     save = sram.Save.from_sram(args.infile)
-    log.info(save.pretty())
-
-    assert (data := save.to_data()) == save.from_data(data).to_data()
+    if log.isEnabledFor(logging.INFO):
+        log.info(save.pretty())
+
+    if args.verify:
+        data = save.to_data()
+        if save.from_data(data).to_data() != data:
+            raise u.FZeroError("Verification failed: data changed after export and re-import")
+        log.debug("Verification OK")
 
 
 def run(argv: t.Optional[t.List[str]] = None) -> None:
@@ -10,6 +10,8 @@ Data reference: https://datacrystal.romhacking.net/wiki/F-Zero:SRAM_map
 from __future__ import annotations
 
 import logging
+import operator
+import struct
 import typing as t
 
 from . import util as u
@@ -51,6 +53,19 @@ LEAGUE_INFO: t.Dict[str, t.Tuple[str, str, str, str, str]] = {
 }
 assert len(LEAGUE_INFO) == LEAGUES
 assert ((_ := set(len(_) for _ in LEAGUE_INFO.values())).pop() == TRACKS and not _)
+DEFAULT_TRACKS: t.Tuple[str, ...] = tuple(f"Track {_ + 1}" for _ in range(TRACKS))
+
+# Pre-compiled binary layouts
+# Record: flags (display+mode+car+minutes), seconds, cents. Checksum: little-endian
+_RECORD_STRUCT: struct.Struct = struct.Struct(">BBB")
+_CHECKSUM_STRUCT: struct.Struct = struct.Struct("<H")
+assert _RECORD_STRUCT.size == RECORD_SIZE
+assert _CHECKSUM_STRUCT.size == CHECKSUM_SIZE
+
+# Record sort key, same order as Record.time but without building a Time per comparison
+_TIME_KEY: t.Callable[[Record], t.Tuple[int, int, int]] = operator.attrgetter(
+    "minutes", "seconds", "cents"
+)
 
 
 class Mode(u.Enum):
@@ -58,11 +73,10 @@ class Mode(u.Enum):
     PRACTICE   = 1
 
     def pretty(self) -> str:
-        # for "type: ignore", see https://github.com/python/mypy/issues/10910
-        return "*" if self is self.PRACTICE else " "  # type: ignore
+        return _MODE_PRETTY[self]
 
     def __str__(self) -> str:
-        return super().__str__()[0]
+        return _MODE_STR[self]
 
 
 class Car(u.Enum):
@@ -71,8 +85,24 @@ class Car(u.Enum):
     GOLDEN_FOX    = 2
     FIRE_STINGRAY = 3
 
+    def pretty(self) -> str:
+        return _CAR_PRETTY[self]
+
+
+# Pre-rendered enum texts, used for every displayed record
+_MODE_PRETTY: t.Dict[Mode, str] = {Mode.GRAND_PRIX: " ", Mode.PRACTICE: "*"}
+_MODE_STR:    t.Dict[Mode, str] = {Mode.GRAND_PRIX: "G", Mode.PRACTICE: "P"}
+_CAR_PRETTY:  t.Dict[Car,  str] = {car: u.Enum.pretty(car) for car in Car}
+
+# Members indexed by value, faster than Enum lookup by value when parsing records
+_CARS:  t.Tuple[Car,  ...] = tuple(Car)
+_MODES: t.Tuple[Mode, ...] = tuple(Mode)
+assert all(member.value == i for members in (_CARS, _MODES) for i, member in enumerate(members))
+
 
 class Record:
+    __slots__ = ("minutes", "seconds", "cents", "car", "mode", "display")
+
     def __init__(
             self,
             minutes: int  = 9,
@@ -90,30 +120,46 @@ class Record:
         self.display = display
 
     @classmethod
-    def from_data(cls, data: bytes) -> Record:
+    def from_data(cls, data: u.Buffer) -> Record:
+        try:
+            fields = _RECORD_STRUCT.unpack(data)
+        except struct.error:
+            log.warning("Invalid Record data: %s", data.hex(":").upper())
+            return cls()
+        return cls._from_fields(*fields)
+
+    @classmethod
+    def _from_fields(cls, flags: int, seconds: int, cents: int) -> Record:
+        """Record from its raw, still BCD-encoded, byte values"""
         try:
-            record = tuple(unpack(data, 8, 8, 4, 2, 1, 1))
+            return cls(
+                cents   = bcd_decode(cents),
+                seconds = bcd_decode(seconds),
+                minutes = bcd_decode(flags & 0x0F),
+                car     = _CARS[flags >> 4 & 0b11],
+                mode    = _MODES[flags >> 6 & 1],
+                display = bool(flags >> 7),
+            )
         except ValueError:
+            data = _RECORD_STRUCT.pack(flags, seconds, cents)
             log.warning("Invalid Record data: %s", data.hex(":").upper())
             return cls()
-        return cls(
-            cents   = record[0],
-            seconds = record[1],
-            minutes = record[2],
-            car     = Car(record[3]),
-            mode    = Mode(record[4]),
-            display = bool(record[5]),
-        )
 
     # Could also be __bytes__
     def to_data(self) -> bytes:
-        return pack(
-            (self.cents,   8),
-            (self.seconds, 8),
-            (self.minutes, 4),
-            (self.car,     2),
-            (self.mode,    1),
-            (self.display, 1),
+        return bytes(self._to_fields())
+
+    def _to_fields(self) -> t.Tuple[int, int, int]:
+        """Raw, BCD-encoded, byte values of this Record. Inverse of _from_fields()"""
+        # BCD encoding inlined, keeping only the last 1 or 2 decimal digits
+        seconds, cents = self.seconds, self.cents
+        return (
+            self.minutes % 10
+            | (self.car.value & 0b11) << 4
+            | (self.mode.value & 1) << 6
+            | int(self.display) << 7,
+            seconds // 10 % 10 << 4 | seconds % 10,
+            cents // 10 % 10 << 4 | cents % 10,
         )
 
     @property
@@ -125,10 +171,10 @@ class Record:
             return "-"
         return f"{self.time.pretty()} {self.mode.pretty()} {self.car.pretty()}"
 
-    def __lt__(self, other):
+    def __lt__(self, other: object) -> bool:
         if not isinstance(other, Record):
             return NotImplemented
-        return self.time < other.time
+        return _TIME_KEY(self) < _TIME_KEY(other)
 
     def __str__(self) -> str:
         text = f"{self.time} {self.mode} {self.car}"
@@ -137,7 +183,8 @@ class Record:
         return text
 
     def __repr__(self) -> str:
-        return "<{}({})>".format(self.__class__.__name__, vars(self))
+        fields = {k: getattr(self, k) for k in self.__slots__}
+        return "<{}({})>".format(self.__class__.__name__, fields)
 
 
 class Time(t.NamedTuple):
@@ -147,33 +194,40 @@ class Time(t.NamedTuple):
 
     def pretty(self) -> str:
         # noinspection GrazieInspection
-        return "{0.minutes}’{0.seconds:02}”{0.cents:02}".format(self)
+        return f"{self.minutes}’{self.seconds:02}”{self.cents:02}"
 
     def __repr__(self) -> str:
-        return "{0.minutes:0}:{0.seconds:02}.{0.cents:02}".format(self)
+        return f"{self.minutes}:{self.seconds:02}.{self.cents:02}"
 
     def __int__(self) -> int:
         return 100 * (60 * self.minutes + self.seconds) + self.cents
 
 
 class League:
+    __slots__ = ("records", "name")
+
     def __init__(self, records: t.Iterable[Record] = (), name: str = ""):
         self.records: t.List[Record] = list(records)
         self.name = name
 
     @classmethod
-    def from_data(cls, data: bytes, name: str = "", raise_on_checksum: bool = False) -> League:
+    def from_data(cls, data: u.Buffer, name: str = "", raise_on_checksum: bool = False) -> League:
+        size = RECORD_SIZE * RECORDS * TRACKS
+        if len(data) < size + CHECKSUM_SIZE:
+            raise u.BadData("League data too short: %s bytes, expected %s",
+                            len(data), size + CHECKSUM_SIZE)
         self = cls(name=name)
-        offset = 0
-        for i in range(TRACKS):
-            for r in range(RECORDS):
-                record = Record.from_data(u.sliced(data, offset, RECORD_SIZE))
+        view = memoryview(data)
+        records = view[:size]  # Shared by record parsing and checksum
+        debug = log.isEnabledFor(logging.DEBUG)
+        for i, fields in enumerate(_RECORD_STRUCT.iter_unpack(records)):
+            record = Record._from_fields(*fields)
+            if debug:
                 log.debug("%04X: Track %02s, record %02s: [%s] %r",
-                          offset, i, r, record.to_data().hex(":"), record)
-                self.records.append(record)
-                offset += RECORD_SIZE
-        checksum = Checksum.parse(u.sliced(data, offset, CHECKSUM_SIZE))
-        expected = Checksum.from_data(u.sliced(data, 0, offset))
+                          i * RECORD_SIZE, *divmod(i, RECORDS), record.to_data().hex(":"), record)
+            self.records.append(record)
+        checksum = Checksum.parse(view[size:size + CHECKSUM_SIZE])
+        expected = Checksum.from_data(records)
         if checksum == expected:
             log.debug("League checksum OK [%s]", checksum)
         else:
@@ -186,54 +240,65 @@ class League:
 
     def to_data(self) -> bytes:
         # TODO: Pad missing records with default record, sort by time
-        data = b''.join(_.to_data() for _ in self.records)
+        data = b''.join([record.to_data() for record in self.records])
         return data + Checksum.from_data(data).to_data()
 
     @property
     def tracks(self) -> t.Tuple[str, ...]:
         """Tuple of track names, based on the previously defined League name"""
-        return LEAGUE_INFO.get(self.name) or tuple(f"Track {_ + 1}" for _ in range(TRACKS))
+        return LEAGUE_INFO.get(self.name, DEFAULT_TRACKS)
 
     def track_records(self) -> t.Iterable[t.Tuple[str, t.List[Record], Record]]:
         """Iterable of (track name, race records, best lap)-tuples for each track"""
-        tracks = self.tracks
-        records = u.chunked(self.records, len(self.records) // len(tracks))  # RECORDS
-        return ((tracks[track], r[:-1], r[-1]) for track, r in enumerate(records))
+        tracks, records = self.tracks, self.records
+        return (
+            (tracks[track], records[offset:offset + RECORDS - 1], records[offset + RECORDS - 1])
+            for track, offset in enumerate(range(0, len(tracks) * RECORDS, RECORDS))
+        )
 
     def pretty(self, level: int = 0, show_hidden_records: bool = False) -> str:
-        msg = ""
+        lines: t.List[str] = []
         indent = level * "\t"
-        for track, records, lap in self.track_records():
-            msg += f"{indent}{track}\n"
-            lap_idx = len(records) + 1
-            for r, record in enumerate(records + [lap], 1):
+        for track, name in enumerate(self.tracks):
+            lines.append(f"{indent}{name}\n")
+            offset = track * RECORDS
+            for r, record in enumerate(self.records[offset:offset + RECORDS], 1):
                 if record.display or show_hidden_records:
-                    label = f"{r:8}" if r < lap_idx else 'Best Lap' # RECORDS
-                    msg += f"{indent}\t{label}: {record.pretty()}\n"
-        return msg
+                    label = f"{r:8}" if r < RECORDS else 'Best Lap'
+                    lines.append(f"{indent}\t{label}: {record.pretty()}\n")
+        return "".join(lines)
 
 
 class Checksum(int):
     @classmethod
-    def parse(cls, checksum: bytes) -> Checksum:
-        return cls.from_bytes(checksum, 'little')
+    def parse(cls, checksum: u.Buffer) -> Checksum:
+        return cls(_CHECKSUM_STRUCT.unpack(checksum)[0])
 
     @classmethod
-    def from_data(cls, data: bytes) -> Checksum:
-        return cls(sum(data))
+    def from_data(cls, data: u.Buffer) -> Checksum:
+        """Sum of all bytes in data, wrapped to CHECKSUM_SIZE. Accepts any bytes-like buffer"""
+        # Iterating bytes is faster than iterating a memoryview, even after the copy
+        return cls(sum(bytes(data)) & ((1 << 8 * CHECKSUM_SIZE) - 1))
 
     def to_data(self) -> bytes:
-        return self.to_bytes(CHECKSUM_SIZE, 'little')
+        return _CHECKSUM_STRUCT.pack(self)
 
     def __str__(self) -> str:
         return self.to_data().hex().upper()
 
 
 class Save:
+    __slots__ = ("leagues", "unlocks", "padding")
+
     SIGNATURE_SIZE: int = len(SIGNATURE)
     LEAGUE_SIZE: int = RECORD_SIZE * RECORDS * TRACKS + CHECKSUM_SIZE
     DATA_SIZE: int = LEAGUE_SIZE * LEAGUES + 2 * SIGNATURE_SIZE + UNLOCKS_SIZE
     assert DATA_SIZE == 512
+    # Header, leagues (records + checksum), unlocks, footer
+    _STRUCT: struct.Struct = struct.Struct(
+        f">{SIGNATURE_SIZE}s" + LEAGUES * f"{LEAGUE_SIZE}s" + f"{UNLOCKS_SIZE}s{SIGNATURE_SIZE}s"
+    )
+    assert _STRUCT.size == DATA_SIZE
 
     def __init__(
         self,
@@ -253,26 +318,22 @@ class Save:
         return cls.from_data(data)
 
     @classmethod
-    def from_data(cls, data: bytes) -> Save:
+    def from_data(cls, data: u.Buffer) -> Save:
+        if len(data) < cls.DATA_SIZE:
+            raise u.BadData("SRAM data too short: %s bytes, expected %s", len(data), cls.DATA_SIZE)
+        header, *leagues, unlocks, footer = cls._STRUCT.unpack_from(data)
         self = cls()
-        cls._check_signature(data, 0, "Header")
-        offset = cls.SIGNATURE_SIZE
-        for i, league in enumerate(LEAGUE_INFO):
-            log.debug("Parsing %s League", league)
-            self.leagues.append(League.from_data(data=u.sliced(data, offset, cls.LEAGUE_SIZE),
-                                                 name=league))
-            offset += cls.LEAGUE_SIZE
-        self.unlocks = cls._parse_unlocks(u.sliced(data, offset, UNLOCKS_SIZE))
-        offset += UNLOCKS_SIZE
-        cls._check_signature(data, offset, "Footer")
-        offset += cls.SIGNATURE_SIZE
-        if len(data) > offset:
-            self.padding = data[offset:offset + 1]
+        cls._check_signature(header, 0, "Header")
+        for name, league in zip(LEAGUE_INFO, leagues):
+            log.debug("Parsing %s League", name)
+            self.leagues.append(League.from_data(data=league, name=name))
+        self.unlocks = cls._parse_unlocks(unlocks)
+        cls._check_signature(footer, cls.DATA_SIZE - cls.SIGNATURE_SIZE, "Footer")
+        self.padding = bytes(data[cls.DATA_SIZE:cls.DATA_SIZE + 1])
         return self
 
     @classmethod
-    def _check_signature(cls, data: bytes, offset: int, label: str) -> bool:
-        signature = u.sliced(data, offset, cls.SIGNATURE_SIZE)
+    def _check_signature(cls, signature: bytes, offset: int, label: str) -> bool:
         check = signature == SIGNATURE
         if check:
             log.debug("%s signature at 0x%04X OK!", label, offset)
@@ -282,21 +343,24 @@ class Save:
         return check
 
     @classmethod
-    def _parse_unlocks(cls, data: bytes) -> t.List[bool]:
-        bits = UNLOCKS_SIZE * 8
-        unlocks, mirror = u.chunked(list(unpack(data, *(bits * [1]))), bits // 2)
-        if unlocks == mirror and set(unlocks[LEAGUES:]) == {0}:
-            log.debug("Master Unlocks OK! [%s], %s", data.hex().upper(), unlocks)
-        else:
+    def _parse_unlocks(cls, data: u.Buffer) -> t.List[bool]:
+        # One bit per league, low nibble mirrored in the high nibble
+        bits = UNLOCKS_SIZE * 8 // 2
+        value = int.from_bytes(data, 'big')
+        unlocks, mirror = value & ((1 << bits) - 1), value >> bits
+        if not (unlocks == mirror and not unlocks >> LEAGUES):
             log.warning("Invalid Master Unlocks data: [%s]", data.hex().upper())
-            unlocks = []
-        return [bool(_) for _ in unlocks][:LEAGUES]
+            return []
+        flags = [bool(unlocks >> i & 1) for i in range(LEAGUES)]
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("Master Unlocks OK! [%s], %s", data.hex().upper(), flags)
+        return flags
 
     def to_data(self, padding: bytes = b'') -> bytes:
         # TODO: Pad missing leagues
         data = (
             SIGNATURE +
-            b''.join(_.to_data() for _ in self.leagues) +
+            b''.join([league.to_data() for league in self.leagues]) +
             self._pack_unlocks() +
             SIGNATURE
         )
@@ -320,8 +384,9 @@ class Save:
                         records.extend(self_races[:RECORDS - 1])
                         records.append(self_lap)
                         continue
-                    records.extend(sorted(self_races + save_races)[:RECORDS - 1])
-                    records.append(min(self_lap, save_lap))
+                    races = sorted(self_races + save_races, key=_TIME_KEY)
+                    records.extend(races[:RECORDS - 1])
+                    records.append(min(self_lap, save_lap, key=_TIME_KEY))
                 self_league.records = records
             self.unlocks = [self_unlock or save_unlock for self_unlock, save_unlock in
                             zip(self.unlocks, save.unlocks)]
@@ -329,33 +394,24 @@ class Save:
 
     def _pack_unlocks(self) -> bytes:
         bits = UNLOCKS_SIZE * 8 // 2
-        unlocks = 2 * (self.unlocks + (bits - len(self.unlocks)) * [False])[:bits]
-        return pack(*zip(unlocks, len(unlocks) * [1]))
+        unlocks = sum(1 << i for i, unlock in enumerate(self.unlocks[:bits]) if unlock)
+        return (unlocks | unlocks << bits).to_bytes(UNLOCKS_SIZE, 'big')
 
     def pretty(self, show_hidden_records=False) -> str:
-        msg = "".join(
-            "\n".join(
-                (
-                    f"{league.name} League",
-                    league.pretty(level=1, show_hidden_records=show_hidden_records),
-                    "",
-                )
-            ) for league in self.leagues
-        )
+        parts: t.List[str] = []
+        for league in self.leagues:
+            parts.append(f"{league.name} League\n")
+            parts.append(league.pretty(level=1, show_hidden_records=show_hidden_records))
+            parts.append("\n")
         unlocks = ", ".join(list(LEAGUE_INFO)[i] for i, v in enumerate(self.unlocks) if v)
-        return msg + "Master difficulty unlocked for leagues: " + (unlocks or "-")
-
+        parts.append("Master difficulty unlocked for leagues: " + (unlocks or "-"))
+        return "".join(parts)
 
-def unpack(data: t.Union[bytes, int], *bit_lengths: int) -> t.Iterable[int]:
-    num: int = int.from_bytes(data, 'big') if isinstance(data, bytes) else data
-    for bits in bit_lengths:
-        yield int("{:x}".format(num & ((1 << bits) - 1)))
-        num >>= bits
 
+def bcd_decode(value: int) -> int:
+    """Decode a Binary-Coded Decimal byte, 0x59 -> 59. Raise ValueError on non-decimal digits"""
+    high, low = value >> 4, value & 0x0F
+    if high > 9 or low > 9:
+        raise ValueError(f"Invalid BCD value: 0x{value:02X}")
+    return 10 * high + low
 
-def pack(*values: t.Tuple[t.SupportsInt, int]) -> bytes:
-    num = shift = 0
-    for value, bits in values:
-        num += (int(str(int(value)), 16) & ((1 << bits) - 1)) << shift
-        shift += bits
-    return num.to_bytes((shift + 7) // 8, 'big')
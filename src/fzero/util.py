@@ -14,6 +14,7 @@ import typing as t
 if t.TYPE_CHECKING:
     import os
     PathLike = t.Union[str, bytes, os.PathLike]
+    Buffer = t.Union[bytes, bytearray, memoryview]
 
 log: logging.Logger = logging.getLogger(__name__)
 